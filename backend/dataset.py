@@ -0,0 +1,169 @@
+import os
+import re
+import glob
+import tensorflow as tf
+
+# Config
+DATA_DIR = '../data/vectorized'
+BATCH_SIZE = 64
+SHUFFLE_BUFFER = 10000
+CYCLE_LENGTH = 4
+SHARD_SEED = 482
+# the notebook drops the longest training sentences (51 ids or more)
+MAX_LENGTH = 50
+FEATURES = ['word', 'pos', 'dep', 'label']
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+
+def find_shards(file_dir, file_base):
+  """ Finds the ids of the vectorized shards in a directory.
+      A shard is complete when its word, part-of-speech,
+      dependency relation and label files all exist
+      (e.g. train-word_vector1.txt, train-pos_vector1.txt, ...).
+
+  Args:
+    file_dir: The directory with the vectorized sentences.
+    file_base: Either 'train', 'val', or 'test'
+
+  Returns:
+    shard_ids: A sorted list of shard ids.
+
+  """
+  pattern = re.compile(re.escape(file_base) + r'-word_vector(\d+)\.txt$')
+  shard_ids = []
+  for path in glob.glob(os.path.join(file_dir, file_base + '-word_vector*.txt')):
+    match = pattern.search(os.path.basename(path))
+    if match is None:
+      continue
+    shard_id = int(match.group(1))
+    if all(os.path.exists(shard_path(file_dir, file_base, feature, shard_id))
+           for feature in FEATURES):
+      shard_ids.append(shard_id)
+  return sorted(shard_ids)
+
+
+def shard_path(file_dir, file_base, feature, shard_id):
+  """ Returns the path of one feature file of a shard. """
+  file_name = file_base + '-' + feature + '_vector' + str(shard_id) + '.txt'
+  return os.path.join(file_dir, file_name)
+
+
+def parse_line(line):
+  """ Converts a line of space separated ids into a
+      vector of integers.
+
+  Args:
+    line: A string tensor with a vectorized sentence.
+
+  Returns:
+    A 1-D int32 tensor.
+
+  """
+  return tf.strings.to_number(tf.strings.split(line), out_type=tf.int32)
+
+
+def read_shard(paths):
+  """ Streams the sentences of a single shard.
+
+  Args:
+    paths: A string tensor with the word, part-of-speech,
+      dependency relation and label file paths of the shard.
+
+  Returns:
+    A dataset of (words, pos, dep, target) tuples.
+
+  """
+  lines = tuple(tf.data.TextLineDataset(paths[i]) for i in range(len(FEATURES)))
+  return tf.data.Dataset.zip(lines)
+
+
+def make_dataset(file_dir, file_base, batch_size=BATCH_SIZE, shuffle=True,
+                 shuffle_buffer=SHUFFLE_BUFFER, max_length=None, repeat=False,
+                 num_workers=1, worker_index=0, drop_remainder=True):
+  """ Builds a streaming input pipeline over the vectorized
+      shards. Shards are read in an interleaved fashion, lines
+      are parsed in parallel, and batches are padded to the
+      longest sentence in the batch and prefetched, so memory
+      use does not depend on the size of the corpus.
+
+  Args:
+    file_dir: The directory with the vectorized sentences.
+    file_base: Either 'train', 'val', or 'test'
+    batch_size: The batch size.
+    shuffle: Whether to shuffle the shards and the sentences.
+    shuffle_buffer: The number of sentences held in the shuffle buffer.
+    max_length: Sentences longer than this are skipped.
+    repeat: Whether to repeat the data indefinitely.
+    num_workers: The number of training workers sharing the data.
+    worker_index: The index of this worker. Every worker reads all
+      the shards and keeps every num_workers-th sentence, so each
+      one sees sentences of every length.
+    drop_remainder: Whether to drop the last batch if it is smaller
+      than batch_size.
+
+  Returns:
+    dataset: A dataset of (words, pos, dep, target) batches.
+
+  """
+  shard_ids = find_shards(file_dir, file_base)
+  if not shard_ids:
+    raise ValueError('No shards found for ' + file_base + ' in ' + file_dir)
+  paths = [[shard_path(file_dir, file_base, feature, shard_id) for feature in FEATURES]
+           for shard_id in shard_ids]
+
+  dataset = tf.data.Dataset.from_tensor_slices(paths)
+  # the seed keeps the shard order the same on every worker
+  if shuffle:
+    dataset = dataset.shuffle(len(paths), seed=SHARD_SEED)
+  if repeat:
+    dataset = dataset.repeat()
+  dataset = dataset.interleave(read_shard,
+                               cycle_length=min(CYCLE_LENGTH, len(paths)),
+                               num_parallel_calls=AUTOTUNE)
+  if num_workers > 1:
+    dataset = dataset.shard(num_workers, worker_index)
+  dataset = dataset.map(lambda words, pos, dep, target: (parse_line(words),
+                                                         parse_line(pos),
+                                                         parse_line(dep),
+                                                         parse_line(target)),
+                        num_parallel_calls=AUTOTUNE)
+  if max_length is not None:
+    dataset = dataset.filter(lambda words, pos, dep, target:
+                             tf.size(words) <= max_length)
+  if shuffle:
+    dataset = dataset.shuffle(shuffle_buffer)
+  dataset = dataset.padded_batch(batch_size,
+                                 padded_shapes=([None], [None], [None], [None]),
+                                 drop_remainder=drop_remainder)
+  return dataset.prefetch(AUTOTUNE)
+
+
+def count_examples(file_dir, file_base, max_length=None):
+  """ Counts the sentences in all the shards without
+      parsing them.
+
+  Args:
+    file_dir: The directory with the vectorized sentences.
+    file_base: Either 'train', 'val', or 'test'
+    max_length: Sentences longer than this are not counted.
+
+  Returns:
+    The number of sentences.
+
+  """
+  count = 0
+  for shard_id in find_shards(file_dir, file_base):
+    with open(shard_path(file_dir, file_base, 'label', shard_id)) as doc:
+      count += sum(1 for line in doc
+                   if max_length is None or len(line.split()) <= max_length)
+  return count
+
+
+if __name__ == '__main__':
+  import time
+  start = time.time()
+  dataset = make_dataset(os.path.join(DATA_DIR, 'train'), 'train')
+  words, pos, dep, target = next(iter(dataset))
+  print('Shards:', find_shards(os.path.join(DATA_DIR, 'train'), 'train'))
+  print('First batch:', words.shape, pos.shape, dep.shape, target.shape)
+  print('Time to first batch {:.2f} sec'.format(time.time() - start))
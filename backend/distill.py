@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import tensorflow as tf
+from encoder import Encoder, load_encoder, save_encoder, evaluate, BATCH_SIZE
+from dataset import make_dataset, count_examples, MAX_LENGTH
+
+# Config
+EPOCHS = 10
+LEARNING_RATE = .001
+SOFT_WEIGHT = .8
+TRAIN_DIR = '../data/vectorized/train'
+TEST_DIR = '../data/vectorized/test'
+TEACHER_PATH = 'model/sc_model'
+STUDENT_DIR = 'model/students'
+LATENCY_RUNS = 200
+
+# Student sizes to train. Every key is an Encoder argument.
+STUDENT_SIZES = {
+  'medium': {'vocab_size': 50002, 'enc_units': 64, 'word_emb_dim': 64,
+             'pos_emb_dim': 32, 'dep_emb_dim': 32},
+  'small': {'vocab_size': 20002, 'enc_units': 48, 'word_emb_dim': 48,
+            'pos_emb_dim': 16, 'dep_emb_dim': 16},
+  'tiny': {'vocab_size': 10002, 'enc_units': 32, 'word_emb_dim': 32,
+           'pos_emb_dim': 8, 'dep_emb_dim': 8}
+}
+
+
+def distillation_loss(teacher_probs, student_probs, targ, words):
+  """ Mixes the loss against the teacher's keep probabilities
+      with the loss against the true labels. Padding and
+      '<bos>' are not counted.
+
+  Args:
+    teacher_probs: The teacher's keep probabilities.
+    student_probs: The student's keep probabilities.
+    targ: The ground truth labels.
+    words: The vectorized words, used to find the padding.
+
+  Returns:
+    The average loss per word.
+
+  """
+  mask = tf.dtypes.cast(tf.math.not_equal(words[:, 1:], 0), tf.float32)
+  labels = tf.dtypes.cast(tf.math.not_equal(targ[:, 1:], 0), tf.float32)
+  student = tf.expand_dims(student_probs[:, 1:], -1)
+  soft = tf.keras.losses.binary_crossentropy(tf.expand_dims(teacher_probs[:, 1:], -1), student)
+  hard = tf.keras.losses.binary_crossentropy(tf.expand_dims(labels, -1), student)
+  loss_ = SOFT_WEIGHT * soft + (1 - SOFT_WEIGHT) * hard
+  return tf.reduce_sum(loss_ * mask) / tf.reduce_sum(mask)
+
+
+def distill(teacher, config, epochs=EPOCHS):
+  """ Trains a student Encoder on the teacher's keep
+      probabilities over the training shards.
+
+  Args:
+    teacher: The trained Encoder.
+    config: The Encoder arguments of the student.
+    epochs: The number of epochs.
+
+  Returns:
+    student: The trained student Encoder.
+
+  """
+  student = Encoder(config['vocab_size'], config['enc_units'], BATCH_SIZE,
+                    word_emb_dim=config['word_emb_dim'],
+                    pos_emb_dim=config['pos_emb_dim'],
+                    dep_emb_dim=config['dep_emb_dim'])
+  optimizer = tf.keras.optimizers.Adam(learning_rate=LEARNING_RATE)
+  steps_per_epoch = count_examples(TRAIN_DIR, 'train', MAX_LENGTH) // BATCH_SIZE
+  dataset = make_dataset(TRAIN_DIR, 'train', max_length=MAX_LENGTH, repeat=True)
+
+  @tf.function(experimental_relax_shapes=True)
+  def train_step(words, pos, dep, targ):
+    teacher_probs = teacher(words, pos, dep)
+    with tf.GradientTape() as tape:
+      student_probs = student(words, pos, dep)
+      loss = distillation_loss(teacher_probs, student_probs, targ, words)
+    variables = student.trainable_variables
+    gradients = tape.gradient(loss, variables)
+    optimizer.apply_gradients(zip(gradients, variables))
+    return loss
+
+  iterator = iter(dataset)
+  for epoch in range(epochs):
+    start = time.time()
+    total_loss = 0
+    for batch in range(steps_per_epoch):
+      batch_loss = train_step(*next(iterator))
+      total_loss += batch_loss
+
+      if batch % 100 == 0:
+        print('Epoch {} Batch {} Loss {:.4f}'.format(epoch + 1,
+                                                     batch,
+                                                     batch_loss.numpy()))
+    print('Epoch {} Loss {:.4f}'.format(epoch + 1,
+                                        total_loss / steps_per_epoch))
+    print('Time taken for 1 epoch {} sec\n'.format(time.time() - start))
+  return student
+
+
+def measure(encoder, teacher=None):
+  """ Measures the accuracy, latency and memory of a model
+      on the test shards. Latency is measured one sentence at
+      a time, the way web_app.py calls the model.
+
+  Args:
+    encoder: The Encoder to measure.
+    teacher: The teacher Encoder to compare the predictions to.
+
+  Returns:
+    A dictionary with the word accuracy, the agreement with
+    the teacher, the mean latency in milliseconds and the
+    size of the weights in megabytes.
+
+  """
+  correct = 0
+  agree = 0
+  total = 0
+  dataset = make_dataset(TEST_DIR, 'test', batch_size=BATCH_SIZE, shuffle=False,
+                         drop_remainder=False)
+  for words, pos, dep, targ in dataset:
+    keep = evaluate(encoder, words, pos, dep) > .5
+    mask = tf.math.not_equal(words[:, 1:], 0)
+    keep = tf.boolean_mask(keep[:, 1:], mask)
+    labels = tf.boolean_mask(tf.math.not_equal(targ[:, 1:], 0), mask)
+    correct += int(tf.reduce_sum(tf.dtypes.cast(tf.equal(keep, labels), tf.int32)))
+    if teacher is not None:
+      teacher_keep = tf.boolean_mask((evaluate(teacher, words, pos, dep) > .5)[:, 1:], mask)
+      agree += int(tf.reduce_sum(tf.dtypes.cast(tf.equal(keep, teacher_keep), tf.int32)))
+    total += int(tf.size(keep))
+
+  sentences = make_dataset(TEST_DIR, 'test', batch_size=1, shuffle=False).take(LATENCY_RUNS)
+  latencies = []
+  for words, pos, dep, targ in sentences:
+    start = time.time()
+    evaluate(encoder, words, pos, dep).numpy()
+    latencies.append(time.time() - start)
+  # skip the first call, which builds the model
+  latencies = latencies[1:]
+
+  num_params = sum(int(tf.size(variable)) for variable in encoder.variables)
+  return {
+    'accuracy': correct / total,
+    'teacher_agreement': agree / total if teacher is not None else 1.0,
+    'latency_ms': 1000 * sum(latencies) / len(latencies),
+    'memory_mb': num_params * 4 / 2 ** 20
+  }
+
+
+def report(results):
+  """ Prints the accuracy, latency and memory of every model.
+
+  Args:
+    results: A dictionary that maps a model name to its measurements.
+
+  Returns:
+    None
+
+  """
+  print('Model     Accuracy  Agreement  Latency (ms)  Memory (MB)')
+  for name, result in results.items():
+    print('{:8s}  {:8.4f}  {:9.4f}  {:12.2f}  {:11.1f}'.format(name,
+                                                             result['accuracy'],
+                                                             result['teacher_agreement'],
+                                                             result['latency_ms'],
+                                                             result['memory_mb']))
+
+
+if __name__ == '__main__':
+  epochs = int(sys.argv[1]) if len(sys.argv) > 1 else EPOCHS
+  names = sys.argv[2:] or list(STUDENT_SIZES)
+  teacher = load_encoder(TEACHER_PATH)
+  results = {'teacher': measure(teacher)}
+  for name in names:
+    config = STUDENT_SIZES[name]
+    student = distill(teacher, config, epochs)
+    save_encoder(student, os.path.join(STUDENT_DIR, name, 'sc_model'))
+    results[name] = measure(student, teacher)
+  report(results)
+  with open(os.path.join(STUDENT_DIR, 'report.json'), 'w') as document:
+    json.dump(results, document, indent=2)
@@ -34,23 +34,38 @@ class Encoder(tf.keras.Model):
       or kept.
 
   Args:
-    vocab_size: Vocabulary size defined by the training set.
+    vocab_size: Vocabulary size defined by the training set. A
+      smaller size keeps only the most frequent words and maps
+      the rest to an extra out-of-vocabulary row.
     enc_units: The number of units for the LSTM.
     batch_size: The batch size.
+    word_emb_dim: The size of the word embeddings.
+    pos_emb_dim: The size of the part-of-speech embeddings.
+    dep_emb_dim: The size of the dependency relation embeddings.
 
   """
-  def __init__(self, vocab_size, enc_units, batch_sz):
+  def __init__(self, vocab_size, enc_units, batch_sz, word_emb_dim=WORD_EMB_DIM,
+               pos_emb_dim=POS_EMB_DIM, dep_emb_dim=DEP_EMB_DIM):
     super(Encoder, self).__init__()
     self.batch_sz = batch_sz
+    self.vocab_size = vocab_size
     self.enc_units = enc_units
-    self.word_embedding = Embedding(WORD_DICT_SIZE, WORD_EMB_DIM, mask_zero=True, embeddings_initializer='glorot_uniform')
-    self.pos_embedding = Embedding(POS_DICT_SIZE, POS_EMB_DIM, mask_zero=True, embeddings_initializer='glorot_uniform')
-    self.dep_embedding = Embedding(DEP_DICT_SIZE, DEP_EMB_DIM, mask_zero=True, embeddings_initializer='glorot_uniform')
-    self.lstm = LSTM(NUM_UNITS, return_sequences=True, return_state=True, dropout=0.5, recurrent_initializer='glorot_uniform')
+    self.word_emb_dim = word_emb_dim
+    self.pos_emb_dim = pos_emb_dim
+    self.dep_emb_dim = dep_emb_dim
+    self.truncated = vocab_size < WORD_DICT_SIZE
+    emb_rows = vocab_size + 1 if self.truncated else vocab_size
+    self.word_embedding = Embedding(emb_rows, word_emb_dim, mask_zero=True, embeddings_initializer='glorot_uniform')
+    self.pos_embedding = Embedding(POS_DICT_SIZE, pos_emb_dim, mask_zero=True, embeddings_initializer='glorot_uniform')
+    self.dep_embedding = Embedding(DEP_DICT_SIZE, dep_emb_dim, mask_zero=True, embeddings_initializer='glorot_uniform')
+    self.lstm = LSTM(enc_units, return_sequences=True, return_state=True, dropout=0.5, recurrent_initializer='glorot_uniform')
     self.bidirectional = Bidirectional(self.lstm, merge_mode='concat')
     self.fc = Dense(1, activation='sigmoid')
 
   def call(self, words, pos, dep):
+    if self.truncated:
+      # word ids are ordered by frequency, the rarer ones share the last row
+      words = tf.minimum(words, tf.dtypes.cast(self.vocab_size, words.dtype))
     word_emb = self.word_embedding(words)
     pos_emb = self.pos_embedding(pos)
     dep_emb = self.dep_embedding(dep)
@@ -61,6 +76,59 @@ class Encoder(tf.keras.Model):
     return output
 
 
+def save_encoder(encoder, model_path):
+  """ Saves the weights of an Encoder together with a config
+      file of its sizes, so load_encoder builds the same shapes.
+
+  Args:
+    encoder: The Encoder model.
+    model_path: The path to save the weights to.
+
+  Returns:
+    None
+
+  """
+  directory = os.path.dirname(model_path)
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+  encoder.save_weights(model_path, save_format='tf')
+  config = {
+    'vocab_size': encoder.vocab_size,
+    'enc_units': encoder.enc_units,
+    'word_emb_dim': encoder.word_emb_dim,
+    'pos_emb_dim': encoder.pos_emb_dim,
+    'dep_emb_dim': encoder.dep_emb_dim
+  }
+  with open(model_path + '.json', 'w') as document:
+    json.dump(config, document)
+
+
+def load_encoder(model_path):
+  """ Builds an Encoder and loads its weights. The sizes of
+      the model are read from the config file saved next to the
+      weights (e.g. model/sc_model.json), if there is one.
+
+  Args:
+    model_path: The path the weights were saved to.
+
+  Returns:
+    encoder: The Encoder model.
+
+  """
+  config = {}
+  if os.path.exists(model_path + '.json'):
+    with open(model_path + '.json') as document:
+      config = json.load(document)
+  encoder = Encoder(config.get('vocab_size', VOCAB_SIZE),
+                    config.get('enc_units', NUM_UNITS),
+                    BATCH_SIZE,
+                    word_emb_dim=config.get('word_emb_dim', WORD_EMB_DIM),
+                    pos_emb_dim=config.get('pos_emb_dim', POS_EMB_DIM),
+                    dep_emb_dim=config.get('dep_emb_dim', DEP_EMB_DIM))
+  encoder.load_weights(model_path)
+  return encoder
+
+
 def evaluate(encoder, words, pos, dep):
   """ Returns the model predictions.
 
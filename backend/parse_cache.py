@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Config
+CACHE_PATH = 'cache/parses.db'
+MAX_ENTRIES = 500000
+COMPACT_EVERY = 1000
+# well below the request deadline, a busy cache is skipped
+BUSY_TIMEOUT_MS = 100
+
+
+class ParseCache:
+  """ Persistent key-value store for parser results, backed by
+      SQLite on local disk. Entries are keyed by the parser call,
+      the sentence text, the parser version and the annotator set,
+      so results from a different CoreNLP build or configuration
+      are never reused.
+
+      The database runs in WAL mode so several forked workers can
+      read while one of them writes. Each thread of each process
+      opens its own connection the first time it touches the cache.
+      Once the number of entries grows past max_entries the oldest
+      ones are dropped and their pages handed back to the file.
+
+  Args:
+    path: The path of the SQLite database file.
+    version: The parser version the results came from.
+    annotators: The annotators used by the parser.
+    max_entries: The maximum number of entries kept on disk.
+
+  """
+  def __init__(self, path=CACHE_PATH, version='', annotators='', max_entries=MAX_ENTRIES):
+    self.path = path
+    self.namespace = version + '|' + annotators
+    self.max_entries = max_entries
+    self._local = threading.local()
+    self._writes = 0
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+
+  def _connection(self):
+    # never share a connection with another thread or a parent process
+    local = self._local
+    if getattr(local, 'pid', None) != os.getpid():
+      conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+      conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      conn.execute('CREATE TABLE IF NOT EXISTS parses ('
+                   'key TEXT PRIMARY KEY, '
+                   'value TEXT NOT NULL, '
+                   'created REAL NOT NULL)')
+      conn.execute('CREATE INDEX IF NOT EXISTS parses_created ON parses (created)')
+      conn.commit()
+      local.conn = conn
+      local.pid = os.getpid()
+    return local.conn
+
+  def _key(self, call, sentence):
+    text = self.namespace + '|' + call + '|' + sentence
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+  def get(self, call, sentence):
+    """ Returns the cached result of a parser call.
+
+    Args:
+      call: The name of the parser call (e.g. 'pos').
+      sentence: The sentence that was parsed.
+
+    Returns:
+      The cached result, or None if it is not in the cache.
+
+    """
+    row = self._connection().execute(
+      'SELECT value FROM parses WHERE key = ?',
+      (self._key(call, sentence),)).fetchone()
+    if row is None:
+      return None
+    return json.loads(row[0])
+
+  def put(self, call, sentence, value):
+    """ Stores the result of a parser call.
+
+    Args:
+      call: The name of the parser call (e.g. 'pos').
+      sentence: The sentence that was parsed.
+      value: The JSON serializable result of the call.
+
+    Returns:
+      None
+
+    """
+    conn = self._connection()
+    with conn:
+      conn.execute('INSERT OR REPLACE INTO parses VALUES (?, ?, ?)',
+                   (self._key(call, sentence), json.dumps(value), time.time()))
+    self._writes += 1
+    if self._writes % COMPACT_EVERY == 0:
+      self.compact()
+
+  def get_or_parse(self, call, sentence, parse):
+    """ Read-through lookup. The parser is only called when
+        the result is not already in the cache, or when the
+        cache cannot be read.
+
+    Args:
+      call: The name of the parser call (e.g. 'pos').
+      sentence: The sentence to parse.
+      parse: A function that parses the sentence.
+
+    Returns:
+      The result of the parser call.
+
+    """
+    # a locked or broken cache must not fail the parse
+    try:
+      value = self.get(call, sentence)
+    except sqlite3.Error:
+      value = None
+    if value is None:
+      value = parse(sentence)
+      try:
+        self.put(call, sentence, value)
+      except sqlite3.Error:
+        pass
+      # match the shape of a cache hit
+      value = json.loads(json.dumps(value))
+    return value
+
+  def compact(self):
+    """ Drops the oldest entries until at most max_entries
+        remain and releases the free pages.
+
+    Returns:
+      The number of entries removed.
+
+    """
+    conn = self._connection()
+    with conn:
+      count = conn.execute('SELECT COUNT(*) FROM parses').fetchone()[0]
+      excess = count - self.max_entries
+      if excess <= 0:
+        return 0
+      conn.execute('DELETE FROM parses WHERE key IN ('
+                   'SELECT key FROM parses ORDER BY created LIMIT ?)', (excess,))
+    conn.execute('PRAGMA incremental_vacuum')
+    return excess
+
+  def __len__(self):
+    return self._connection().execute('SELECT COUNT(*) FROM parses').fetchone()[0]
+
+
+def warm(sNLP, file_name):
+  """ Parses every sentence in a file so that later requests
+      for them are served from the cache. The sentences are
+      parsed the same way web_app.get_sentence parses them.
+
+  Args:
+    sNLP: A StanfordNLP parser with a cache.
+    file_name: A text file with one sentence per line.
+
+  Returns:
+    The number of sentences parsed.
+
+  """
+  count = 0
+  with open(file_name) as document:
+    for line in document:
+      sentence = '<bos> ' + line.strip() + ' <eos>'
+      sNLP.word_tokenize(sentence)
+      sNLP.word_tokenize(sentence.lower())
+      sNLP.pos(sentence.lower())
+      sNLP.dependency_parse(sentence.lower())
+      count += 1
+  return count
+
+
+if __name__ == '__main__':
+  from parser import StanfordNLP
+  sNLP = StanfordNLP(cache_path=CACHE_PATH)
+  for file_name in sys.argv[1:]:
+    print(file_name, warm(sNLP, file_name))
+  print('Entries:', len(sNLP.cache))
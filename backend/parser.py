@@ -1,7 +1,15 @@
+import json
+import requests
 from stanfordcorenlp import StanfordCoreNLP
+from parse_cache import ParseCache
+from resilience import CircuitBreaker, BoundedPool, DeadlineExceeded, Unavailable
+
+# CoreNLP release the server runs (stanford-corenlp-full-2018-02-27)
+PARSER_VERSION = '3.9.1'
+PARSER_THREADS = 8
 
 class StanfordNLP:
-    def __init__(self, host='http://18.188.143.217', port=9000):
+    def __init__(self, host='http://18.188.143.217', port=9000, cache_path=None):
         self.nlp = StanfordCoreNLP(host, port=port,
         timeout=30000)  # , quiet=False, logging_level=logging.DEBUG)
         self.props = {
@@ -9,16 +17,68 @@ class StanfordNLP:
         'pipelineLanguage': 'en',
         'outputFormat': 'json'
         }
-    def word_tokenize(self, sentence):
-        return self.nlp.word_tokenize(sentence)
-    def pos(self, sentence):
-        return self.nlp.pos_tag(sentence)
-    def ner(self, sentence):
-        return self.nlp.ner(sentence)
-    def parse(self, sentence):
-        return self.nlp.parse(sentence)
-    def dependency_parse(self, sentence):
-        return self.nlp.dependency_parse(sentence)
+        # results are reused across processes and restarts
+        self.cache = None
+        if cache_path is not None:
+            self.cache = ParseCache(cache_path, PARSER_VERSION, self.props['annotators'])
+        # calls with a deadline give up on a slow server instead of blocking
+        self.breaker = CircuitBreaker()
+        self.pool = BoundedPool(PARSER_THREADS)
+    def _request(self, annotators, sentence, timeout=None):
+        # same request as StanfordCoreNLP._request, which has no socket timeout
+        properties = {'annotators': annotators, 'outputFormat': 'json'}
+        params = {'properties': str(properties), 'pipelineLanguage': self.nlp.lang}
+        try:
+            r = requests.post(self.nlp.url, params=params, data=sentence.encode('utf-8'),
+                              headers={'Connection': 'close'}, timeout=timeout)
+        except requests.Timeout:
+            raise DeadlineExceeded('Parser call timed out')
+        except requests.ConnectionError:
+            raise Unavailable('Parser is unreachable')
+        # a struggling server answers with plain text errors
+        if r.status_code != 200:
+            raise Unavailable('Parser returned HTTP ' + str(r.status_code))
+        try:
+            return json.loads(r.text)
+        except ValueError:
+            raise Unavailable('Parser returned an invalid response')
+    def _call(self, name, parse, sentence, deadline):
+        if deadline is None:
+            request = parse
+        else:
+            request = lambda text: self.breaker.call(self.pool, parse, text,
+                                                     deadline.check(name))
+        if self.cache is None:
+            return request(sentence)
+        return self.cache.get_or_parse(name, sentence, request)
+    def _word_tokenize(self, sentence, timeout=None):
+        r_dict = self._request('ssplit,tokenize', sentence, timeout)
+        return [token['originalText'] for s in r_dict['sentences'] for token in s['tokens']]
+    def _pos(self, sentence, timeout=None):
+        r_dict = self._request('pos', sentence, timeout)
+        return [(token['originalText'], token['pos'])
+                for s in r_dict['sentences'] for token in s['tokens']]
+    def _ner(self, sentence, timeout=None):
+        r_dict = self._request('ner', sentence, timeout)
+        return [(token['originalText'], token['ner'])
+                for s in r_dict['sentences'] for token in s['tokens']]
+    def _parse(self, sentence, timeout=None):
+        r_dict = self._request('pos,parse', sentence, timeout)
+        return [s['parse'] for s in r_dict['sentences']][0]
+    def _dependency_parse(self, sentence, timeout=None):
+        r_dict = self._request('depparse', sentence, timeout)
+        return [(dep['dep'], dep['governor'], dep['dependent'])
+                for s in r_dict['sentences'] for dep in s['basicDependencies']]
+    def word_tokenize(self, sentence, deadline=None):
+        return self._call('word_tokenize', self._word_tokenize, sentence, deadline)
+    def pos(self, sentence, deadline=None):
+        return self._call('pos', self._pos, sentence, deadline)
+    def ner(self, sentence, deadline=None):
+        return self._call('ner', self._ner, sentence, deadline)
+    def parse(self, sentence, deadline=None):
+        return self._call('parse', self._parse, sentence, deadline)
+    def dependency_parse(self, sentence, deadline=None):
+        return self._call('dependency_parse', self._dependency_parse, sentence, deadline)
 
 
 
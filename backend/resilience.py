@@ -0,0 +1,227 @@
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Config
+REQUEST_DEADLINE = 5.0
+MAX_ACTIVE = 8
+MAX_QUEUED = 16
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 10.0
+RETRY_AFTER = 1
+# calls with less time left are not attempted and not held against the parser
+MIN_PARSER_BUDGET = 0.5
+
+
+class Unavailable(Exception):
+  """ Raised when a request cannot be served right now.
+
+  Args:
+    message: A description of the failure.
+    retry_after: The number of seconds the client should wait
+      before trying again.
+
+  """
+  def __init__(self, message, retry_after=RETRY_AFTER):
+    super(Unavailable, self).__init__(message)
+    self.retry_after = max(1, int(round(retry_after)))
+
+
+class DeadlineExceeded(Unavailable):
+  """ Raised when a request runs out of time. """
+
+
+class CircuitOpen(Unavailable):
+  """ Raised when the parser is failing and calls are rejected. """
+
+
+class Overloaded(Unavailable):
+  """ Raised when the request queue or the parser threads are full. """
+
+
+class Deadline:
+  """ The time budget of a single request. It is passed to
+      every stage of the request so later stages only get the
+      time the earlier ones left over.
+
+  Args:
+    seconds: The time budget in seconds.
+
+  """
+  def __init__(self, seconds=REQUEST_DEADLINE):
+    self.expires = time.monotonic() + seconds
+
+  def remaining(self):
+    return max(0.0, self.expires - time.monotonic())
+
+  def check(self, stage):
+    """ Raises DeadlineExceeded if there is no time left.
+
+    Args:
+      stage: The name of the stage about to start.
+
+    Returns:
+      The number of seconds left.
+
+    """
+    remaining = self.remaining()
+    if remaining <= 0:
+      raise DeadlineExceeded('Deadline exceeded before ' + stage)
+    return remaining
+
+
+class CircuitBreaker:
+  """ Stops calling a failing dependency. After failure_threshold
+      failures in a row every call is rejected right away for
+      reset_timeout seconds. Then a single trial call is let
+      through; the circuit closes again if it succeeds.
+
+  Args:
+    failure_threshold: The number of failures in a row that opens
+      the circuit.
+    reset_timeout: The number of seconds the circuit stays open.
+
+  """
+  def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.failures = 0
+    self.opened_at = None
+    self.trial = None
+    self.lock = threading.Lock()
+
+  def _before_call(self):
+    # returns a token that marks the trial call, None otherwise
+    with self.lock:
+      if self.opened_at is None:
+        return None
+      waited = time.monotonic() - self.opened_at
+      if waited < self.reset_timeout:
+        raise CircuitOpen('Parser circuit is open', self.reset_timeout - waited)
+      if self.trial is not None:
+        raise CircuitOpen('Parser circuit is half open', RETRY_AFTER)
+      self.trial = object()
+      return self.trial
+
+  def _cancel_call(self, token):
+    # the call never reached the parser
+    with self.lock:
+      if token is not None and token is self.trial:
+        self.trial = None
+
+  def _after_call(self, token, success):
+    with self.lock:
+      if self.opened_at is not None:
+        # only the trial decides when an open circuit closes
+        if token is None or token is not self.trial:
+          return
+        self.trial = None
+        if success:
+          self.failures = 0
+          self.opened_at = None
+        else:
+          self.opened_at = time.monotonic()
+      elif success:
+        self.failures = 0
+      else:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+          self.opened_at = time.monotonic()
+
+  def call(self, pool, function, argument, timeout):
+    """ Runs function(argument, timeout) on a thread pool and
+        waits for it at most timeout seconds. The function must
+        stop by itself once the timeout passes. Timeouts and
+        errors count as failures, unless the call had less than
+        MIN_PARSER_BUDGET seconds to begin with, in which case it
+        is not attempted.
+
+    Args:
+      pool: The BoundedPool to run the function on.
+      function: The function to call.
+      argument: The argument of the function.
+      timeout: The number of seconds to wait.
+
+    Returns:
+      The result of the function.
+
+    """
+    if timeout < MIN_PARSER_BUDGET:
+      raise DeadlineExceeded('Not enough time left for the parser')
+    token = self._before_call()
+    try:
+      future = pool.submit(function, argument, timeout)
+    except Overloaded:
+      self._cancel_call(token)
+      raise
+    try:
+      result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+      future.cancel()
+      self._after_call(token, False)
+      raise DeadlineExceeded('Parser call timed out')
+    except Exception:
+      self._after_call(token, False)
+      raise
+    self._after_call(token, True)
+    return result
+
+
+class BoundedPool:
+  """ A thread pool that rejects work when every thread is busy
+      instead of queueing it, so calls abandoned during an
+      incident do not pile up and run later.
+
+  Args:
+    threads: The number of threads.
+
+  """
+  def __init__(self, threads):
+    self.pool = ThreadPoolExecutor(threads)
+    self.slots = threading.BoundedSemaphore(threads)
+
+  def submit(self, function, *args):
+    if not self.slots.acquire(blocking=False):
+      raise Overloaded('All parser threads are busy')
+    future = self.pool.submit(function, *args)
+    # also runs when the future is cancelled
+    future.add_done_callback(lambda done: self.slots.release())
+    return future
+
+
+class AdmissionControl:
+  """ Bounds the number of requests being served and waiting.
+      Requests that arrive when the queue is full are rejected
+      right away instead of waiting behind a slow parser.
+
+  Args:
+    max_active: The number of requests served at the same time.
+    max_queued: The number of requests allowed to wait.
+
+  """
+  def __init__(self, max_active=MAX_ACTIVE, max_queued=MAX_QUEUED):
+    self.max_queued = max_queued
+    self.active = threading.BoundedSemaphore(max_active)
+    self.queued = 0
+    self.lock = threading.Lock()
+
+  @contextmanager
+  def slot(self, deadline):
+    """ Waits for a free slot until the deadline. """
+    with self.lock:
+      if self.queued >= self.max_queued:
+        raise Overloaded('Too many requests')
+      self.queued += 1
+    try:
+      acquired = self.active.acquire(timeout=deadline.remaining())
+    finally:
+      with self.lock:
+        self.queued -= 1
+    if not acquired:
+      raise Overloaded('Timed out waiting in the request queue')
+    try:
+      yield
+    finally:
+      self.active.release()
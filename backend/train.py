@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import multiprocessing
+import tensorflow as tf
+from encoder import Encoder, save_encoder, VOCAB_SIZE, NUM_UNITS, BATCH_SIZE
+from dataset import make_dataset, count_examples, MAX_LENGTH
+
+# Config
+EPOCHS = 40
+LEARNING_RATE = .001
+BASE_PORT = 23456
+BENCHMARK_STEPS = 50
+POLL_INTERVAL = 1.0
+TRAIN_DIR = '../data/vectorized/train'
+MODEL_PATH = 'model/sc_model'
+CHECKPOINT_DIR = './training_checkpoints'
+
+loss_object = tf.keras.losses.BinaryCrossentropy(from_logits=True, reduction='none')
+
+
+def loss_function(real, pred):
+  """ Loss function. Sums the average loss of every time
+      step except '<bos>', like the per time step loop in the
+      notebook, but without unrolling over the sentence length.
+
+  Args:
+    real: The ground truth labels.
+    pred: The predicted probabilities.
+
+  Returns:
+    The summed loss.
+
+  """
+  labels = tf.math.logical_not(tf.math.equal(real[:, 1:], 0))
+  new_target = tf.dtypes.cast(labels, tf.float32)
+  loss_ = loss_object(tf.expand_dims(new_target, -1), tf.expand_dims(pred[:, 1:], -1))
+  return tf.reduce_sum(tf.reduce_mean(loss_, axis=0))
+
+
+def train(worker_index, num_workers, epochs=EPOCHS, steps_per_epoch=None,
+          model_path=MODEL_PATH, checkpoint_dir=CHECKPOINT_DIR):
+  """ Trains the Encoder in one worker process. The workers
+      keep a copy of the model each and all-reduce their
+      gradients after every batch, so they stay in sync.
+      TF_CONFIG must describe the cluster before this is called.
+
+  Args:
+    worker_index: The index of this worker.
+    num_workers: The number of workers.
+    epochs: The number of epochs.
+    steps_per_epoch: The number of batches per epoch. Defaults
+      to one pass over the training shards.
+    model_path: Where the chief saves the final weights.
+    checkpoint_dir: Where the chief saves training checkpoints.
+
+  Returns:
+    The number of sentences per second processed by all workers.
+
+  """
+  # share the cores between the workers
+  threads = max(1, multiprocessing.cpu_count() // num_workers)
+  tf.config.threading.set_intra_op_parallelism_threads(threads)
+  tf.config.threading.set_inter_op_parallelism_threads(2)
+
+  strategy = tf.distribute.experimental.MultiWorkerMirroredStrategy()
+  is_chief = worker_index == 0
+  if steps_per_epoch is None:
+    steps_per_epoch = count_examples(TRAIN_DIR, 'train', MAX_LENGTH) // (BATCH_SIZE * num_workers)
+
+  dataset = make_dataset(TRAIN_DIR, 'train', max_length=MAX_LENGTH, repeat=True,
+                         num_workers=num_workers, worker_index=worker_index)
+  # each worker already reads its own part of the data
+  options = tf.data.Options()
+  options.experimental_distribute.auto_shard = False
+  dataset = dataset.with_options(options)
+
+  with strategy.scope():
+    encoder = Encoder(VOCAB_SIZE, NUM_UNITS, BATCH_SIZE)
+    optimizer = tf.keras.optimizers.Adam(learning_rate=LEARNING_RATE)
+    checkpoint = tf.train.Checkpoint(optimizer=optimizer, encoder=encoder)
+    dist_dataset = strategy.experimental_distribute_dataset(dataset)
+
+  def train_step(words, pos, dep, targ):
+    with tf.GradientTape() as tape:
+      predictions = encoder(words, pos, dep)
+      # gradients are summed over the workers
+      loss = loss_function(targ, predictions) / strategy.num_replicas_in_sync
+    variables = encoder.trainable_variables
+    gradients = tape.gradient(loss, variables)
+    optimizer.apply_gradients(zip(gradients, variables))
+    return loss / tf.dtypes.cast(tf.shape(targ)[1], tf.float32)
+
+  # one trace for every sentence length, so the workers never retrace
+  # at different steps and disagree on their collective keys
+  batch_spec = tf.TensorSpec(shape=[None, None], dtype=tf.int32)
+
+  @tf.function(input_signature=[batch_spec] * 4)
+  def distributed_train_step(words, pos, dep, targ):
+    per_replica_loss = strategy.experimental_run_v2(train_step, args=(words, pos, dep, targ))
+    return strategy.reduce(tf.distribute.ReduceOp.SUM, per_replica_loss, axis=None)
+
+  # non-chief workers write to a scratch directory
+  if not is_chief:
+    scratch = tempfile.mkdtemp()
+    model_path = os.path.join(scratch, 'sc_model')
+    checkpoint_dir = scratch
+  checkpoint_prefix = os.path.join(checkpoint_dir, 'ckpt')
+
+  iterator = iter(dist_dataset)
+  total_time = 0
+  for epoch in range(epochs):
+    start = time.time()
+    total_loss = 0
+
+    for batch in range(steps_per_epoch):
+      batch_loss = distributed_train_step(*next(iterator))
+      total_loss += batch_loss
+
+      if is_chief and batch % 100 == 0:
+        print('Epoch {} Batch {} Loss {:.4f}'.format(epoch + 1,
+                                                     batch,
+                                                     batch_loss.numpy()))
+    # the first epoch includes tracing the graph
+    if epoch > 0 or epochs == 1:
+      total_time += time.time() - start
+    # saving (checkpoint) the model every 2 epochs
+    if (epoch + 1) % 2 == 0:
+      checkpoint.save(file_prefix=checkpoint_prefix)
+
+    if is_chief:
+      print('Epoch {} Loss {:.4f}'.format(epoch + 1,
+                                          total_loss / steps_per_epoch))
+      print('Time taken for 1 epoch {} sec\n'.format(time.time() - start))
+
+  # same format that web_app.py loads, with a config file that
+  # replaces the one of any student deployed there before
+  save_encoder(encoder, model_path)
+  timed_epochs = max(1, epochs - 1)
+  return timed_epochs * steps_per_epoch * BATCH_SIZE * num_workers / total_time
+
+
+def launch(num_workers, epochs=EPOCHS, steps_per_epoch=None,
+           model_path=MODEL_PATH, checkpoint_dir=CHECKPOINT_DIR):
+  """ Starts the workers as local processes that talk to each
+      other over localhost and waits for them to finish.
+
+  Args:
+    num_workers: The number of workers.
+    epochs: The number of epochs.
+    steps_per_epoch: The number of batches per epoch.
+    model_path: Where the chief saves the final weights.
+    checkpoint_dir: Where the chief saves training checkpoints.
+
+  Returns:
+    The number of sentences per second reported by the chief.
+
+  """
+  workers = ['localhost:' + str(BASE_PORT + i) for i in range(num_workers)]
+  handle, result_file = tempfile.mkstemp(suffix='.json')
+  os.close(handle)
+  processes = []
+  for i in range(num_workers):
+    env = dict(os.environ)
+    env['TF_CONFIG'] = json.dumps({
+      'cluster': {'worker': workers},
+      'task': {'type': 'worker', 'index': i}
+    })
+    args = [sys.executable, __file__, 'worker', str(i), str(num_workers),
+            str(epochs), str(steps_per_epoch or 0), model_path, checkpoint_dir,
+            result_file]
+    processes.append(subprocess.Popen(args, env=env))
+  # a dead worker leaves the others blocked in the all-reduce
+  codes = [None] * num_workers
+  while None in codes:
+    time.sleep(POLL_INTERVAL)
+    codes = [process.poll() for process in processes]
+    if any(codes):
+      for process in processes:
+        if process.poll() is None:
+          process.terminate()
+      for process in processes:
+        process.wait()
+      os.remove(result_file)
+      raise RuntimeError('Worker exited with codes ' + str(codes))
+  with open(result_file) as document:
+    throughput = json.load(document)['throughput']
+  os.remove(result_file)
+  return throughput
+
+
+def benchmark(max_workers, steps=BENCHMARK_STEPS):
+  """ Measures the training throughput for 1 to max_workers
+      workers.
+
+  Args:
+    max_workers: The largest number of workers to try.
+    steps: The number of batches per worker per epoch.
+
+  Returns:
+    results: A list of (workers, sentences per second) tuples.
+
+  """
+  # keep the serving model untouched
+  scratch = tempfile.mkdtemp()
+  results = []
+  for num_workers in range(1, max_workers + 1):
+    throughput = launch(num_workers, epochs=2, steps_per_epoch=steps,
+                        model_path=os.path.join(scratch, 'sc_model'),
+                        checkpoint_dir=scratch)
+    results.append((num_workers, throughput))
+  base = results[0][1]
+  print('Workers  Sentences/sec  Speedup')
+  for num_workers, throughput in results:
+    print('{:7d}  {:13.1f}  {:7.2f}'.format(num_workers, throughput, throughput / base))
+  return results
+
+
+if __name__ == '__main__':
+  if sys.argv[1] == 'train':
+    num_workers = int(sys.argv[2])
+    epochs = int(sys.argv[3]) if len(sys.argv) > 3 else EPOCHS
+    launch(num_workers, epochs)
+  elif sys.argv[1] == 'benchmark':
+    benchmark(int(sys.argv[2]))
+  elif sys.argv[1] == 'worker':
+    worker_index = int(sys.argv[2])
+    num_workers = int(sys.argv[3])
+    epochs = int(sys.argv[4])
+    steps_per_epoch = int(sys.argv[5]) or None
+    throughput = train(worker_index, num_workers, epochs, steps_per_epoch,
+                       sys.argv[6], sys.argv[7])
+    if worker_index == 0:
+      with open(sys.argv[8], 'w') as document:
+        json.dump({'throughput': throughput}, document)
@@ -1,7 +1,8 @@
 from flask import Flask, request, render_template, jsonify
 from parser import StanfordNLP, format_pos, format_dep_parse
-from encoder import VOCAB_SIZE, NUM_UNITS, BATCH_SIZE
-from encoder import Encoder, evaluate
+from parse_cache import CACHE_PATH
+from resilience import Deadline, AdmissionControl, Unavailable
+from encoder import load_encoder, evaluate
 from prepare import create_seq_mappings
 from utils import read_file
 
@@ -10,11 +11,13 @@ app = Flask(__name__)
 app.secret_key = b'_5#y2L"F4Q8z]/'
 
 # Initialize Model
-encoder = Encoder(VOCAB_SIZE, NUM_UNITS, BATCH_SIZE)
-encoder.load_weights('model/sc_model')
+encoder = load_encoder('model/sc_model')
 
 # Initialize parser
-sNLP = StanfordNLP()
+sNLP = StanfordNLP(cache_path=CACHE_PATH)
+
+# Bound the requests in flight so a slow parser sheds load
+admission = AdmissionControl()
 
 # Get vocabulary and dictionaries
 word_vocab = read_file('word_vocab.txt')
@@ -33,18 +36,38 @@ word_vocab = read_file('word_vocab.txt')
 
 @app.route('/<sentence>')
 def get_sentence(sentence):
+    # every stage of the request shares one time budget
+    deadline = Deadline()
+    with admission.slot(deadline):
+        data = compress(sentence, deadline)
+    data = jsonify(data)
+    data.headers.add('Access-Control-Allow-Origin', '*')
+    return data
+
+
+@app.errorhandler(Unavailable)
+def unavailable(error):
+    data = jsonify({'error': str(error)})
+    data.status_code = 503
+    data.headers.add('Retry-After', str(error.retry_after))
+    data.headers.add('Access-Control-Allow-Origin', '*')
+    return data
+
+
+def compress(sentence, deadline):
     # add markers
     sentence = '<bos> ' + sentence + ' <eos>'
     # parse sentence
     ids = {
-        'reg_words': sNLP.word_tokenize(sentence),
-        'lower_words': sNLP.word_tokenize(sentence.lower()),
-        'pos': format_pos(sNLP.pos(sentence.lower())),
-        'dep': format_dep_parse(sNLP.dependency_parse(sentence.lower()))
+        'reg_words': sNLP.word_tokenize(sentence, deadline),
+        'lower_words': sNLP.word_tokenize(sentence.lower(), deadline),
+        'pos': format_pos(sNLP.pos(sentence.lower(), deadline)),
+        'dep': format_dep_parse(sNLP.dependency_parse(sentence.lower(), deadline))
     }
     # vectorize sequences
     words, pos, dep = create_seq_mappings([ids['lower_words']], [ids['pos']], [ids['dep']], word_vocab, word2id, pos2id, dep2id) 
     # get predictions
+    deadline.check('inference')
     res = evaluate(encoder, words, pos, dep)
     results = []
     data = {}    
@@ -63,8 +86,6 @@ def get_sentence(sentence):
                 'word': word,
                 'keep': keep
         }
-    data = jsonify(data)
-    data.headers.add('Access-Control-Allow-Origin', '*')
     return data
 
 